@@ -16,7 +16,10 @@ from torchmetrics.functional.regression.cosine_similarity import cosine_similari
 from torchmetrics.functional.regression.crps import continuous_ranked_probability_score
 from torchmetrics.functional.regression.csi import critical_success_index
 from torchmetrics.functional.regression.explained_variance import explained_variance
-from torchmetrics.functional.regression.js_divergence import jensen_shannon_divergence
+from torchmetrics.functional.regression.js_divergence import (
+    jensen_shannon_divergence,
+    jensen_shannon_divergence_many,
+)
 from torchmetrics.functional.regression.kendall import kendall_rank_corrcoef
 from torchmetrics.functional.regression.kl_divergence import kl_divergence
 from torchmetrics.functional.regression.log_cosh import log_cosh_error
@@ -41,6 +44,7 @@ __all__ = [
     "critical_success_index",
     "explained_variance",
     "jensen_shannon_divergence",
+    "jensen_shannon_divergence_many",
     "kendall_rank_corrcoef",
     "kl_divergence",
     "log_cosh_error",
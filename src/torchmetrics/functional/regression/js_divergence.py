@@ -12,15 +12,62 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Union
+from math import log
+from typing import Optional, Sequence, Union
 
 import torch
 from torch import Tensor
 from typing_extensions import Literal
 
-from torchmetrics.functional.regression.kl_divergence import kl_divergence
 from torchmetrics.utilities.checks import _check_same_shape
 
+_LOG_2 = log(2)
+
+
+def _accumulation_dtype(x: Tensor) -> Optional[torch.dtype]:
+    """Return the dtype to sum over the outcomes in, which is float32 for reduced precision inputs."""
+    return torch.float32 if x.dtype in (torch.float16, torch.bfloat16) else None
+
+
+def _jsd_update_probs(p: Tensor, q: Tensor) -> Tensor:
+    """Compute jensen-shannon divergence scores for each observation from (unnormalized) probabilities.
+
+    Kept free of input validation and python-side tensor construction, such that the full computation can be traced
+    as a single graph when the caller compiles the metric.
+
+    """
+    p = p / p.sum(dim=-1, keepdim=True)
+    q = q / q.sum(dim=-1, keepdim=True)
+    # with m = (p + q) / 2: p / m = 2 * p / (p + q), which saves materializing the mixture distribution. The factor
+    # stays inside the log, as adding log(2) after the row sum cancels against its terms and loses precision. The
+    # clamp only affects entries where both p and q are zero, such that xlogy sees 0 / tiny = 0 instead of
+    # 0 / 0 = nan and returns 0 for them
+    pq = (p + q).clamp_min(torch.finfo(p.dtype).tiny)
+    # accumulating and scaling in place is safe for autograd, as neither div, xlogy nor sum need their output for
+    # backward
+    terms = torch.special.xlogy(p, (p / pq).mul_(2)).add_(torch.special.xlogy(q, (q / pq).mul_(2)))
+    # rounding can leave the scores of nearly identical distributions slightly below zero, which the divergence
+    # cannot be, and which would turn the jensen-shannon distance into nan
+    return terms.sum(dim=-1, dtype=_accumulation_dtype(terms)).mul_(0.5).clamp_min(0.0).to(p.dtype)
+
+
+def _jsd_update_logprobs(p: Tensor, q: Tensor) -> Tensor:
+    """Compute jensen-shannon divergence scores for each observation from log-probabilities."""
+    # zero probabilities are -inf in log space, where the log-ratios and the gradient of logaddexp become nan. Clamping
+    # to the lowest finite value keeps them finite, while exp still maps those entries to zero probability, such that
+    # they contribute zero like they do through xlogy in the probability branch
+    p, q = p.clamp_min(torch.finfo(p.dtype).min), q.clamp_min(torch.finfo(q.dtype).min)
+    mean = torch.logaddexp(p, q).sub_(_LOG_2)
+    terms = (p.exp() * (p - mean)).add_(q.exp() * (q - mean))
+    return terms.sum(dim=-1, dtype=_accumulation_dtype(terms)).mul_(0.5).clamp_min(0.0).to(p.dtype)
+
+
+def _jsd_check_inputs(p: Tensor, q: Tensor) -> None:
+    """Check that both distributions are 2D tensors of the same shape."""
+    _check_same_shape(p, q)
+    if p.ndim != 2:
+        raise ValueError(f"Expected both p and q distribution to be 2D but got {p.ndim} and {q.ndim} respectively")
+
 
 def _jsd_update(p: Tensor, q: Tensor, log_prob: bool) -> tuple[Tensor, int]:
     """Update and returns jensen-shannon divergence scores for each observation and the total number of observations.
@@ -32,34 +79,27 @@ def _jsd_update(p: Tensor, q: Tensor, log_prob: bool) -> tuple[Tensor, int]:
             will normalize to make sure the distributes sum to 1
 
     """
-    _check_same_shape(p, q)
-    if p.ndim != 2 or q.ndim != 2:
-        raise ValueError(f"Expected both p and q distribution to be 2D but got {p.ndim} and {q.ndim} respectively")
+    _jsd_check_inputs(p, q)
 
-    total = p.shape[0]
-    if log_prob:
-        mean = torch.logsumexp(torch.stack([p, q]), dim=0) - torch.log(torch.tensor(2.0))
-        measures = 0.5 * kl_divergence(p, mean, log_prob=log_prob, reduction=None) + 0.5 * kl_divergence(
-            q, mean, log_prob=log_prob, reduction=None
-        )
-    else:
-        p = p / p.sum(axis=-1, keepdim=True)  # type: ignore[call-overload]
-        q = q / q.sum(axis=-1, keepdim=True)  # type: ignore[call-overload]
-        mean = (p + q) / 2
-        measures = 0.5 * kl_divergence(p, mean, log_prob=log_prob, reduction=None) + 0.5 * kl_divergence(
-            q, mean, log_prob=log_prob, reduction=None
-        )
-    return measures, total
+    # half precision is emulated on cpu, so compute in float32 and cast the result back
+    half_on_cpu = p.dtype == torch.float16 and p.device.type == "cpu"
+    if half_on_cpu:
+        p, q = p.float(), q.float()
+    # row reductions over the last dimension are fastest on contiguous memory, this is a no-op for contiguous inputs
+    p, q = p.contiguous(), q.contiguous()
+    measures = _jsd_update_logprobs(p, q) if log_prob else _jsd_update_probs(p, q)
+    return (measures.half() if half_on_cpu else measures), p.shape[0]
 
 
 def _jsd_compute(
     measures: Tensor, total: Union[int, Tensor], reduction: Literal["mean", "sum", "none", None] = "mean"
 ) -> Tensor:
     """Compute and reduce the Jensen-Shannon divergence based on the type of reduction."""
+    # the modular metric passes already summed measures, which do not need another reduction
     if reduction == "sum":
-        return measures.sum()
+        return measures if measures.ndim == 0 else measures.sum()
     if reduction == "mean":
-        return measures.sum() / total
+        return (measures if measures.ndim == 0 else measures.sum()) / total
     if reduction is None or reduction == "none":
         return measures
     return measures / total
@@ -100,3 +140,71 @@ def jensen_shannon_divergence(
     """
     measures, total = _jsd_update(p, q, log_prob)
     return _jsd_compute(measures, total, reduction)
+
+
+def jensen_shannon_divergence_many(
+    ps: Sequence[Tensor],
+    qs: Sequence[Tensor],
+    log_prob: bool = False,
+    reduction: Literal["mean", "sum", "none", None] = "mean",
+) -> Tensor:
+    r"""Compute `Jensen-Shannon divergence`_ for many pairs of distributions in a single call.
+
+    Gives the same result as stacking :func:`jensen_shannon_divergence` computed for every pair in ``zip(ps, qs)``, but
+    evaluates all pairs together. This avoids the per-call overhead of looping when scoring many small pairs.
+
+    Args:
+        ps: sequence of ``B`` data distributions, each with shape ``[N, d]``
+        qs: sequence of ``B`` prior or approximate distributions, each with shape ``[N, d]``
+        log_prob: bool indicating if input is log-probabilities or probabilities. If given as probabilities,
+            will normalize to make sure the distributes sum to 1
+        reduction:
+            Determines how to reduce over the ``N``/batch dimension of each pair:
+
+            - ``'mean'`` [default]: Averages score across samples, returns shape ``[B]``
+            - ``'sum'``: Sum score across samples, returns shape ``[B]``
+            - ``'none'`` or ``None``: Returns score per sample, with shape ``[B, N]``
+
+    Raises:
+        ValueError:
+            If ``ps`` and ``qs`` do not contain the same number of distributions.
+        ValueError:
+            If ``ps`` and ``qs`` are empty.
+        ValueError:
+            If the distributions in ``ps`` and ``qs`` do not all have the same shape.
+        ValueError:
+            If the distributions are not 2D.
+        ValueError:
+            If ``reduction`` is not one of ``'mean'``, ``'sum'``, ``'none'`` or ``None``.
+
+    Example:
+        >>> from torch import tensor
+        >>> ps = [tensor([[0.36, 0.48, 0.16]]), tensor([[0.1, 0.9, 0.0]])]
+        >>> qs = [tensor([[1/3, 1/3, 1/3]]), tensor([[0.5, 0.5, 0.0]])]
+        >>> jensen_shannon_divergence_many(ps, qs)
+        tensor([0.0225, 0.1017])
+
+    """
+    if len(ps) != len(qs):
+        raise ValueError(
+            f"Expected `ps` and `qs` to contain the same number of distributions but got {len(ps)} and {len(qs)}"
+        )
+    if len(ps) == 0:
+        raise ValueError("Expected `ps` and `qs` to contain at least one distribution")
+    shapes = {tuple(x.shape) for x in (*ps, *qs)}
+    if len(shapes) != 1:
+        raise ValueError(f"Expected all p and q distributions to have the same shape but got {sorted(shapes)}")
+    allowed_reduction = ["mean", "sum", "none", None]
+    if reduction not in allowed_reduction:
+        raise ValueError(f"Expected argument `reduction` to be one of {allowed_reduction} but got {reduction}")
+    p, q = torch.stack(list(ps)), torch.stack(list(qs))
+    if p.ndim != 3:
+        raise ValueError(f"Expected all p and q distributions to be 2D but got {p.ndim - 1}D")
+
+    measures, _ = _jsd_update(p.flatten(0, 1), q.flatten(0, 1), log_prob)
+    measures = measures.reshape(p.shape[:2])
+    if reduction == "sum":
+        return measures.sum(dim=-1)
+    if reduction == "mean":
+        return measures.mean(dim=-1)
+    return measures
@@ -11,16 +11,18 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from itertools import groupby
 from math import log
-from typing import Any, List, Optional, Sequence, Union, cast
+from typing import Any, Callable, ClassVar, List, Optional, Sequence, Union, cast
 
 import torch
 from torch import Tensor
 from typing_extensions import Literal
 
-from torchmetrics.functional.regression.js_divergence import _jsd_compute, _jsd_update
+from torchmetrics.functional.regression.js_divergence import _jsd_check_inputs, _jsd_compute, _jsd_update
 from torchmetrics.metric import Metric
 from torchmetrics.utilities.data import dim_zero_cat
+from torchmetrics.utilities.distributed import gather_all_tensors
 from torchmetrics.utilities.imports import _MATPLOTLIB_AVAILABLE
 from torchmetrics.utilities.plot import _AX_TYPE, _PLOT_OUT_TYPE
 
@@ -58,16 +60,35 @@ class JensenShannonDivergence(Metric):
             - ``'sum'``: Sum score across samples
             - ``'none'`` or ``None``: Returns score per sample
 
+        batch_updates: bool indicating if inputs passed to ``update`` should be buffered and evaluated together once
+            enough rows have been collected (or when the metric is computed). This reduces the number of kernel
+            launches when ``update`` is called many times with small batches, at the cost of keeping copies of the
+            buffered inputs in memory. Can not be combined with ``compute_on_cpu=True``, which would move every
+            buffered input to the CPU and evaluate it there.
+        use_cuda_graph: bool indicating if the computation of the scores should be captured in a CUDA graph and
+            replayed for subsequent inputs with the same shape, dtype and device. Only applies to CUDA inputs that do
+            not require gradients, other inputs are evaluated eagerly. Inputs with a new shape trigger a new capture.
         kwargs: Additional keyword arguments, see :ref:`Metric kwargs` for more info.
 
     Raises:
         TypeError:
             If ``log_prob`` is not an ``bool``.
+        TypeError:
+            If ``batch_updates`` is not an ``bool``.
+        ValueError:
+            If ``batch_updates=True`` is combined with ``compute_on_cpu=True``.
+        TypeError:
+            If ``use_cuda_graph`` is not an ``bool``.
         ValueError:
             If ``reduction`` is not one of ``'mean'``, ``'sum'``, ``'none'`` or ``None``.
 
-    .. attention::
-        Half precision is only support on GPU for this metric.
+    .. note::
+        Half precision inputs on CPU are computed in ``float32`` and the per-sample scores are cast back to half.
+
+    .. tip::
+        To score many independent pairs of distributions at once, prefer
+        :func:`~torchmetrics.functional.regression.jensen_shannon_divergence_many` over looping over
+        :func:`~torchmetrics.functional.regression.jensen_shannon_divergence`, as it evaluates all pairs in one call.
 
     Example:
         >>> from torch import tensor
@@ -86,13 +107,28 @@ class JensenShannonDivergence(Metric):
     plot_lower_bound: float = 0.0
     plot_upper_bound: float = log(2)
 
+    # the captured CUDA graph can not be scripted
+    __jit_ignored_attributes__: ClassVar[list[str]] = [*Metric.__jit_ignored_attributes__, "_graph", "_graph_key"]
+
     measures: Union[Tensor, List[Tensor]]
     total: Tensor
+    p_buffer: List[Tensor]
+    q_buffer: List[Tensor]
+    _graph: Optional[torch.cuda.CUDAGraph]
+    _graph_key: Optional[tuple]
+    _static_p: Optional[Tensor]
+    _static_q: Optional[Tensor]
+    _static_measures: Optional[Tensor]
+
+    # number of buffered rows after which ``update`` evaluates the buffered inputs when ``batch_updates=True``
+    _buffer_flush_rows: int = 1024
 
     def __init__(
         self,
         log_prob: bool = False,
         reduction: Literal["mean", "sum", "none", None] = "mean",
+        batch_updates: bool = False,
+        use_cuda_graph: bool = False,
         **kwargs: Any,
     ) -> None:
         super().__init__(**kwargs)
@@ -105,29 +141,171 @@ class JensenShannonDivergence(Metric):
             raise ValueError(f"Expected argument `reduction` to be one of {allowed_reduction} but got {reduction}")
         self.reduction = reduction
 
+        if not isinstance(batch_updates, bool):
+            raise TypeError(f"Expected argument `batch_updates` to be bool but got {batch_updates}")
+        if batch_updates and self.compute_on_cpu:
+            raise ValueError("Argument `batch_updates=True` can not be combined with `compute_on_cpu=True`")
+        self.batch_updates = batch_updates
+
+        if not isinstance(use_cuda_graph, bool):
+            raise TypeError(f"Expected argument `use_cuda_graph` to be bool but got {use_cuda_graph}")
+        self.use_cuda_graph = use_cuda_graph
+        self._graph = None
+        self._graph_key = None
+        self._static_p = None
+        self._static_q = None
+        self._static_measures = None
+
         if self.reduction in ["mean", "sum"]:
             self.add_state("measures", torch.tensor(0.0), dist_reduce_fx="sum")
         else:
             self.add_state("measures", [], dist_reduce_fx="cat")
         self.add_state("total", torch.tensor(0), dist_reduce_fx="sum")
+        if self.batch_updates:
+            self.add_state("p_buffer", [], dist_reduce_fx="cat")
+            self.add_state("q_buffer", [], dist_reduce_fx="cat")
+        self._buf_rows = 0
 
     def update(self, p: Tensor, q: Tensor) -> None:
         """Update the metric state."""
-        measures, total = _jsd_update(p, q, self.log_prob)
+        if not self.batch_updates:
+            self._update_measures(*self._compute_measures(p, q))
+            return
+
+        _jsd_check_inputs(p, q)
+        # buffered inputs are concatenated along the batch dimension, which requires a shared number of outcomes
+        if self.p_buffer and self.p_buffer[-1].shape[-1] != p.shape[-1]:
+            self._flush_buffers()
+        if not self.p_buffer:
+            # the buffers may also have been emptied by ``reset``
+            self._buf_rows = 0
+        # copy the inputs, such that the metric does not change when the caller reuses their memory. ``update`` runs
+        # without gradients outside of ``forward``, so the copies do not keep the autograd graph of the inputs alive
+        self.p_buffer.append(p.clone())
+        self.q_buffer.append(q.clone())
+        self._buf_rows += p.shape[0]
+        if self._buf_rows >= self._buffer_flush_rows:
+            self._flush_buffers()
+
+    def compute(self) -> Tensor:
+        """Compute metric."""
+        if self.batch_updates:
+            # evaluating the buffered inputs into the state means that ``forward``, which computes the value of its
+            # batch before merging it into the global state, only evaluates every batch once
+            self._flush_buffers()
+        measures, total = self.measures, self.total
+        if self.reduction is None or self.reduction == "none":
+            measures = dim_zero_cat(measures)
+        return _jsd_compute(cast(Tensor, measures), total, self.reduction)
+
+    def _sync_dist(self, dist_sync_fn: Callable = gather_all_tensors, process_group: Optional[Any] = None) -> None:
+        """Evaluate the local input buffers before syncing, so that every process gathers empty buffers.
+
+        Otherwise processes with and without buffered inputs would gather tensors of different dimensionality.
+
+        """
+        if self.batch_updates:
+            self._flush_buffers()
+        super()._sync_dist(dist_sync_fn=dist_sync_fn, process_group=process_group)
+
+    def unsync(self, should_unsync: bool = True) -> None:
+        """Restore the local metric state, including the input buffers that were evaluated for syncing."""
+        super().unsync(should_unsync=should_unsync)
+        if self.batch_updates:
+            self._buf_rows = self._count_buffered_rows()
+
+    def _reduce_states(self, incoming_state: dict[str, Any]) -> None:
+        """Add an incoming metric state to the current state of the metric, which may include buffered inputs."""
+        super()._reduce_states(incoming_state)
+        if self.batch_updates:
+            self._buf_rows = self._count_buffered_rows()
+
+    def _count_buffered_rows(self) -> int:
+        """Count the rows of all buffered inputs, for when the buffers were replaced outside of ``update``."""
+        if isinstance(self.p_buffer, Tensor):
+            return self.p_buffer.shape[0]
+        return sum(x.shape[0] for x in self.p_buffer)
+
+    def _update_measures(self, measures: Tensor, total: int) -> None:
+        """Add the scores of a batch of observations to the metric state."""
         if self.reduction is None or self.reduction == "none":
             cast(List[Tensor], self.measures).append(measures)
         else:
-            self.measures = cast(Tensor, self.measures) + measures.sum()
+            state, batch_sum = cast(Tensor, self.measures), measures.sum()
+            # accumulating in place would silently cast higher precision scores down to the dtype of the state
+            if torch.result_type(state, batch_sum) == state.dtype:
+                state.add_(batch_sum)
+            else:
+                self.measures = state + batch_sum
             self.total += total
 
-    def compute(self) -> Tensor:
-        """Compute metric."""
-        measures: Tensor = (
-            dim_zero_cat(cast(List[Tensor], self.measures))
-            if self.reduction in ["none", None]
-            else cast(Tensor, self.measures)
-        )
-        return _jsd_compute(measures, self.total, self.reduction)
+    def _buffered_measures(self) -> Optional[tuple[Tensor, int]]:
+        """Compute the scores of all buffered inputs, evaluating consecutive inputs with the same shape together."""
+        p_buffer = self.p_buffer if isinstance(self.p_buffer, list) else [self.p_buffer]
+        q_buffer = self.q_buffer if isinstance(self.q_buffer, list) else [self.q_buffer]
+        measures, total = [], 0
+        # the buffers are synced as a single (possibly empty) tensor, and may hold several shapes after merging states
+        pairs = ((p, q) for p, q in zip(p_buffer, q_buffer) if p.numel() > 0)
+        for _, group in groupby(pairs, key=lambda pair: pair[0].shape[-1]):
+            p, q = zip(*group)
+            group_measures, group_total = self._compute_measures(torch.cat(p), torch.cat(q))
+            measures.append(group_measures)
+            total += group_total
+        return (torch.cat(measures), total) if measures else None
+
+    def _compute_measures(self, p: Tensor, q: Tensor) -> tuple[Tensor, int]:
+        """Compute the scores of a batch of observations, replaying a CUDA graph when enabled and possible."""
+        requires_grad = torch.is_grad_enabled() and (p.requires_grad or q.requires_grad)
+        # inputs on different devices are left to the eager computation, which raises for them
+        if not self.use_cuda_graph or not p.is_cuda or p.device != q.device or requires_grad:
+            return _jsd_update(p, q, self.log_prob)
+
+        _jsd_check_inputs(p, q)
+        key = (p.shape, p.dtype, q.dtype, p.device)
+        # capture and replay on the device of the inputs, which need not be the current device
+        with torch.cuda.device(p.device):
+            if self._graph is None or self._graph_key != key:
+                self._capture_graph(p, q)
+                self._graph_key = key
+            else:
+                cast(Tensor, self._static_p).copy_(p)
+                cast(Tensor, self._static_q).copy_(q)
+            cast(torch.cuda.CUDAGraph, self._graph).replay()
+        # the graph overwrites its output on every replay
+        return cast(Tensor, self._static_measures).clone(), p.shape[0]
+
+    def _capture_graph(self, p: Tensor, q: Tensor) -> None:
+        """Capture the computation of the scores for inputs with the shape, dtype and device of ``p`` and ``q``."""
+        self._static_p = p.detach().clone(memory_format=torch.contiguous_format)
+        self._static_q = q.detach().clone(memory_format=torch.contiguous_format)
+        # warm up on a side stream before capturing, as recommended for ``torch.cuda.graph``
+        stream = torch.cuda.Stream(device=p.device)
+        stream.wait_stream(torch.cuda.current_stream(p.device))
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                _jsd_update(self._static_p, self._static_q, self.log_prob)
+        torch.cuda.current_stream(p.device).wait_stream(stream)
+
+        self._graph = torch.cuda.CUDAGraph()
+        # without an explicit stream, the capture would use a stream cached on the first device a graph was captured on
+        with torch.cuda.graph(self._graph, stream=stream):
+            self._static_measures, _ = _jsd_update(self._static_p, self._static_q, self.log_prob)
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Get the current state of the metric, leaving out the captured CUDA graph which can not be copied."""
+        state = super().__getstate__()
+        for attr in ("_graph", "_graph_key", "_static_p", "_static_q", "_static_measures"):
+            state[attr] = None
+        return state
+
+    def _flush_buffers(self) -> None:
+        """Evaluate all buffered inputs and add their scores to the metric state."""
+        buffered = self._buffered_measures()
+        if buffered is not None:
+            self._update_measures(*buffered)
+        self.p_buffer = []
+        self.q_buffer = []
+        self._buf_rows = 0
 
     def plot(
         self, val: Optional[Union[Tensor, Sequence[Tensor]]] = None, ax: Optional[_AX_TYPE] = None
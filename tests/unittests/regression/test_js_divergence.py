@@ -18,12 +18,10 @@ from typing import NamedTuple, Optional
 import numpy as np
 import pytest
 import torch
-from scipy.spatial.distance import jensenshannon
 from torch import Tensor
 
-from torchmetrics.functional.regression.js_divergence import jensen_shannon_divergence
+from torchmetrics.functional.regression.js_divergence import jensen_shannon_divergence, jensen_shannon_divergence_many
 from torchmetrics.regression.js_divergence import JensenShannonDivergence
-from torchmetrics.utilities.imports import _TORCH_GREATER_EQUAL_2_1
 from unittests import BATCH_SIZE, EXTRA_DIM, NUM_BATCHES
 from unittests._helpers import seed_all
 from unittests._helpers.testers import MetricTester
@@ -47,11 +45,16 @@ _log_probs_inputs = _Input(
 )
 
 
-def _wrap_reduction(p: Tensor, q: Tensor, log_prob: bool, reduction: Optional[str] = "mean"):
+def _reference_numpy_jsd(p: Tensor, q: Tensor, log_prob: bool, reduction: Optional[str] = "mean"):
     if log_prob:
         p = p.softmax(dim=-1)
         q = q.softmax(dim=-1)
-    res = jensenshannon(p, q, axis=1) ** 2
+    p = p.numpy() / p.numpy().sum(axis=1, keepdims=True)
+    q = q.numpy() / q.numpy().sum(axis=1, keepdims=True)
+    m = (p + q) / 2
+    kl_pm = np.where(p > 0, p * (np.log(p) - np.log(m)), 0.0).sum(axis=1)
+    kl_qm = np.where(q > 0, q * (np.log(q) - np.log(m)), 0.0).sum(axis=1)
+    res = 0.5 * (kl_pm + kl_qm)
     if reduction == "mean":
         return np.mean(res)
     if reduction == "sum":
@@ -69,16 +72,17 @@ class TestJensenShannonDivergence(MetricTester):
 
     atol = 1e-6
 
+    @pytest.mark.parametrize("batch_updates", [False, True])
     @pytest.mark.parametrize("ddp", [pytest.param(True, marks=pytest.mark.DDP), False])
-    def test_jensen_shannon_divergence(self, reduction, p, q, log_prob, ddp):
+    def test_jensen_shannon_divergence(self, reduction, p, q, log_prob, ddp, batch_updates):
         """Test class implementation of metric."""
         self.run_class_metric_test(
             ddp,
             p,
             q,
             JensenShannonDivergence,
-            partial(_wrap_reduction, log_prob=log_prob, reduction=reduction),
-            metric_args={"log_prob": log_prob, "reduction": reduction},
+            partial(_reference_numpy_jsd, log_prob=log_prob, reduction=reduction),
+            metric_args={"log_prob": log_prob, "reduction": reduction, "batch_updates": batch_updates},
         )
 
     def test_jensen_shannon_divergence_functional(self, reduction, p, q, log_prob):
@@ -87,7 +91,7 @@ class TestJensenShannonDivergence(MetricTester):
             p,
             q,
             jensen_shannon_divergence,
-            partial(_wrap_reduction, log_prob=log_prob, reduction=reduction),
+            partial(_reference_numpy_jsd, log_prob=log_prob, reduction=reduction),
             metric_args={"log_prob": log_prob, "reduction": reduction},
         )
 
@@ -101,11 +105,6 @@ class TestJensenShannonDivergence(MetricTester):
             metric_args={"log_prob": log_prob, "reduction": reduction},
         )
 
-    # JensenShannonDivergence half + cpu does not work due to missing support in torch.clamp
-    @pytest.mark.skipif(
-        not _TORCH_GREATER_EQUAL_2_1,
-        reason="Pytoch below 2.1 does not support cpu + half precision used in JensenShannonDivergence metric",
-    )
     def test_jensen_shannon_divergence_half_cpu(self, reduction, p, q, log_prob):
         """Test dtype support of the metric on CPU."""
         self.run_precision_test_cpu(
@@ -142,3 +141,228 @@ def test_zero_probability():
         torch.tensor(torch.randn(3, 3).softmax(dim=-1)),
     )
     assert not torch.isnan(metric.compute())
+
+
+def test_zero_probability_in_both_distributions():
+    """When both p and q are zero for the same outcome the contribution should be zero and not Nan."""
+    p = torch.tensor([[0.5, 0.5, 0.0], [0.2, 0.8, 0.0]])
+    q = torch.tensor([[0.25, 0.75, 0.0], [0.6, 0.4, 0.0]])
+    res = jensen_shannon_divergence(p, q, reduction="none")
+    assert not torch.isnan(res).any()
+    assert torch.allclose(res, jensen_shannon_divergence(p[:, :2], q[:, :2], reduction="none"))
+
+
+def test_zero_probability_log_prob():
+    """Zero probabilities given as -inf log-probabilities should match the result for probabilities."""
+    p = torch.tensor([[0.5, 0.5, 0.0], [0.2, 0.8, 0.0], [1.0, 0.0, 0.0]])
+    q = torch.tensor([[0.25, 0.75, 0.0], [0.6, 0.3, 0.1], [0.3, 0.3, 0.4]])
+    log_p, log_q = p.log().requires_grad_(), q.log().requires_grad_()
+    res = jensen_shannon_divergence(log_p, log_q, log_prob=True, reduction="none")
+    assert not torch.isnan(res).any()
+    assert torch.allclose(res, jensen_shannon_divergence(p, q, reduction="none"))
+
+    res.sum().backward()
+    assert not torch.isnan(log_p.grad).any()
+    assert not torch.isnan(log_q.grad).any()
+    # outcomes with zero probability in both distributions do not affect the score
+    assert torch.all(log_p.grad[:, 2][:2] == 0)
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+def test_identical_distributions(dtype):
+    """The divergence of a distribution with itself should be exactly zero and never negative."""
+    p = torch.rand(BATCH_SIZE, 1000, dtype=dtype)
+    p = p / p.sum(dim=-1, keepdim=True)
+    res = jensen_shannon_divergence(p, p, reduction="none")
+    assert torch.all(res == 0)
+    q = p * (1 + 1e-4 * torch.randn_like(p)).abs()
+    assert torch.all(jensen_shannon_divergence(p, q, reduction="none") >= 0)
+    assert torch.all(jensen_shannon_divergence(p.log(), q.log(), log_prob=True, reduction="none") >= 0)
+
+
+@pytest.mark.parametrize("reduction", ["mean", "sum", "none"])
+def test_double_precision(reduction):
+    """Test that double precision inputs are accumulated and returned in double precision."""
+    p, q = _probs_inputs.p.double(), _probs_inputs.q.double()
+    metric = JensenShannonDivergence(reduction=reduction)
+    for i in range(NUM_BATCHES):
+        metric.update(p[i], q[i])
+    res = metric.compute()
+    assert res.dtype == torch.float64
+    expected = jensen_shannon_divergence(p.flatten(0, 1), q.flatten(0, 1), reduction=reduction)
+    assert torch.allclose(res, expected, rtol=1e-12, atol=0)
+
+
+@pytest.mark.parametrize("reduction", ["mean", "sum", "none"])
+@pytest.mark.parametrize("log_prob", [False, True])
+def test_batch_updates(reduction, log_prob):
+    """Test that buffering the inputs of ``update`` gives the same result as evaluating every batch directly."""
+    inputs = _log_probs_inputs if log_prob else _probs_inputs
+    metric = JensenShannonDivergence(log_prob=log_prob, reduction=reduction)
+    buffered_metric = JensenShannonDivergence(log_prob=log_prob, reduction=reduction, batch_updates=True)
+    buffered_metric._buffer_flush_rows = 3 * BATCH_SIZE
+    for i in range(NUM_BATCHES):
+        metric.update(inputs.p[i], inputs.q[i])
+        buffered_metric.update(inputs.p[i], inputs.q[i])
+    # a different number of outcomes forces the buffer to be evaluated before appending
+    metric.update(inputs.p[0, :, :3], inputs.q[0, :, :3])
+    buffered_metric.update(inputs.p[0, :, :3], inputs.q[0, :, :3])
+    assert torch.allclose(metric.compute(), buffered_metric.compute())
+
+    assert torch.allclose(metric(inputs.p[1], inputs.q[1]), buffered_metric(inputs.p[1], inputs.q[1]))
+    assert not buffered_metric.p_buffer
+    assert torch.allclose(metric.compute(), buffered_metric.compute())
+
+
+def test_batch_updates_copies_inputs():
+    """Test that reusing the memory of an input after ``update`` does not change the buffered input."""
+    p, q = _probs_inputs.p[0].clone(), _probs_inputs.q[0].clone()
+    metric = JensenShannonDivergence(batch_updates=True)
+    metric.update(p, q)
+    p.fill_(1.0)
+    q.fill_(1.0)
+    assert torch.allclose(metric.compute(), jensen_shannon_divergence(_probs_inputs.p[0], _probs_inputs.q[0]))
+
+
+def test_batch_updates_forward_evaluates_once():
+    """Test that ``forward`` evaluates the inputs of every batch only once."""
+    metric = JensenShannonDivergence(batch_updates=True)
+    calls = []
+    compute_measures = metric._compute_measures
+
+    def _count_calls(p, q):
+        calls.append(p.shape[0])
+        return compute_measures(p, q)
+
+    metric._compute_measures = _count_calls
+    for i in range(3):
+        metric(_probs_inputs.p[i], _probs_inputs.q[i])
+    assert calls == [BATCH_SIZE] * 3
+    expected = jensen_shannon_divergence(_probs_inputs.p[:3].flatten(0, 1), _probs_inputs.q[:3].flatten(0, 1))
+    assert torch.allclose(metric.compute(), expected)
+
+
+def test_batch_updates_sync():
+    """Test that buffered inputs are evaluated before syncing, so that every process gathers empty buffers."""
+    metric = JensenShannonDivergence(reduction="none")
+    buffered_metric = JensenShannonDivergence(reduction="none", batch_updates=True)
+    metric.update(_probs_inputs.p[0], _probs_inputs.q[0])
+    buffered_metric.update(_probs_inputs.p[0], _probs_inputs.q[0])
+
+    gathered = []
+
+    def _dist_sync_fn(x, group=None):
+        gathered.append(x)
+        return [x]
+
+    buffered_metric._buffer_flush_rows = 2 * BATCH_SIZE
+    buffered_metric.sync(dist_sync_fn=_dist_sync_fn, distributed_available=lambda: True)
+    assert all(x.ndim <= 1 for x in gathered)
+    buffered_metric.unsync()
+    # the restored buffers still count towards evaluating them once enough rows have been collected
+    assert buffered_metric._buf_rows == BATCH_SIZE
+    metric.update(_probs_inputs.p[1], _probs_inputs.q[1])
+    buffered_metric.update(_probs_inputs.p[1], _probs_inputs.q[1])
+    assert not buffered_metric.p_buffer
+    assert torch.allclose(metric.compute(), buffered_metric.compute())
+
+
+def test_batch_updates_error_on_compute_on_cpu():
+    """Test that error is raised if ``batch_updates`` is combined with ``compute_on_cpu``."""
+    with pytest.raises(ValueError, match="can not be combined with `compute_on_cpu=True`"):
+        JensenShannonDivergence(batch_updates=True, compute_on_cpu=True)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="test requires cuda")
+@pytest.mark.parametrize("reduction", ["mean", "none"])
+def test_cuda_graph(reduction):
+    """Test that replaying a captured CUDA graph gives the same result as evaluating every batch eagerly."""
+    metric = JensenShannonDivergence(reduction=reduction).cuda()
+    graph_metric = JensenShannonDivergence(reduction=reduction, use_cuda_graph=True).cuda()
+    for i in range(NUM_BATCHES):
+        metric.update(_probs_inputs.p[i].cuda(), _probs_inputs.q[i].cuda())
+        graph_metric.update(_probs_inputs.p[i].cuda(), _probs_inputs.q[i].cuda())
+    # a different number of outcomes triggers a new capture
+    metric.update(_probs_inputs.p[0, :, :3].cuda(), _probs_inputs.q[0, :, :3].cuda())
+    graph_metric.update(_probs_inputs.p[0, :, :3].cuda(), _probs_inputs.q[0, :, :3].cuda())
+    assert graph_metric._graph is not None
+    assert torch.allclose(metric.compute(), graph_metric.compute())
+    assert graph_metric.clone()._graph is None
+
+    # inputs that require gradients are evaluated eagerly, such that the batch value stays differentiable
+    p = _probs_inputs.p[1].cuda().requires_grad_()
+    res = graph_metric(p, _probs_inputs.q[1].cuda())
+    res.backward()
+    assert p.grad is not None
+
+
+@pytest.mark.skipif(torch.cuda.device_count() < 2, reason="test requires at least two GPUs")
+def test_cuda_graph_non_default_device():
+    """Test that the CUDA graph is captured and replayed on the device of the inputs, not the current device."""
+    device = torch.device("cuda:1")
+    metric = JensenShannonDivergence(reduction="none").to(device)
+    graph_metric = JensenShannonDivergence(reduction="none", use_cuda_graph=True).to(device)
+    with torch.cuda.device(0):
+        for i in range(NUM_BATCHES):
+            metric.update(_probs_inputs.p[i].to(device), _probs_inputs.q[i].to(device))
+            graph_metric.update(_probs_inputs.p[i].to(device), _probs_inputs.q[i].to(device))
+    assert graph_metric._graph is not None
+    assert graph_metric._static_measures.device == device
+    assert torch.allclose(metric.compute(), graph_metric.compute())
+
+
+@pytest.mark.parametrize("reduction", ["mean", "none"])
+def test_cuda_graph_cpu_fallback(reduction):
+    """Test that CPU inputs are evaluated eagerly when ``use_cuda_graph=True``."""
+    metric = JensenShannonDivergence(reduction=reduction)
+    graph_metric = JensenShannonDivergence(reduction=reduction, use_cuda_graph=True)
+    for i in range(NUM_BATCHES):
+        metric.update(_probs_inputs.p[i], _probs_inputs.q[i])
+        graph_metric.update(_probs_inputs.p[i], _probs_inputs.q[i])
+    assert graph_metric._graph is None
+    assert torch.allclose(metric.compute(), graph_metric.compute())
+
+    p = _probs_inputs.p[0].clone().requires_grad_()
+    res = graph_metric(p, _probs_inputs.q[0])
+    assert torch.allclose(res, metric(_probs_inputs.p[0], _probs_inputs.q[0]))
+    res.sum().backward()
+    assert p.grad is not None
+
+
+@pytest.mark.parametrize("reduction", ["mean", "sum", "none"])
+@pytest.mark.parametrize("log_prob", [False, True])
+def test_jensen_shannon_divergence_many(reduction, log_prob):
+    """Test that scoring many pairs at once matches scoring every pair separately."""
+    inputs = _log_probs_inputs if log_prob else _probs_inputs
+    res = jensen_shannon_divergence_many(list(inputs.p), list(inputs.q), log_prob=log_prob, reduction=reduction)
+    expected = torch.stack([
+        jensen_shannon_divergence(p, q, log_prob=log_prob, reduction=reduction) for p, q in zip(inputs.p, inputs.q)
+    ])
+    assert res.shape == expected.shape
+    assert torch.allclose(res, expected, atol=1e-6)
+
+
+def test_jensen_shannon_divergence_many_error_on_different_length():
+    """Test that error is raised if a different number of p and q distributions is given."""
+    with pytest.raises(ValueError, match="Expected `ps` and `qs` to contain the same number of distributions"):
+        jensen_shannon_divergence_many([torch.rand(2, 3)] * 2, [torch.rand(2, 3)])
+
+
+def test_jensen_shannon_divergence_many_error_on_empty():
+    """Test that error is raised if no distributions are given."""
+    with pytest.raises(ValueError, match="Expected `ps` and `qs` to contain at least one distribution"):
+        jensen_shannon_divergence_many([], [])
+
+
+def test_jensen_shannon_divergence_many_error_on_different_shape():
+    """Test that error is raised if the distributions do not all have the same shape."""
+    with pytest.raises(ValueError, match="Expected all p and q distributions to have the same shape"):
+        jensen_shannon_divergence_many([torch.rand(2, 3), torch.rand(4, 3)], [torch.rand(2, 3), torch.rand(4, 3)])
+    with pytest.raises(ValueError, match="Expected all p and q distributions to have the same shape"):
+        jensen_shannon_divergence_many([torch.rand(2, 3)], [torch.rand(2, 4)])
+
+
+def test_jensen_shannon_divergence_many_error_on_reduction():
+    """Test that error is raised for an unknown reduction."""
+    with pytest.raises(ValueError, match="Expected argument `reduction` to be one of"):
+        jensen_shannon_divergence_many([torch.rand(2, 3)], [torch.rand(2, 3)], reduction="bogus")